@@ -1,48 +1,174 @@
 #!/usr/bin/env python3
 
 import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import fnmatch
+import functools
+import io
+from itertools import islice
+import os
 from pathlib import Path
+import re
 import sys
 import subprocess
 import json
-
-EXCLUDED_DIRS = list(
-    set(
-        [
-            ".git",
-            "node_modules",
-            ".vscode",
-            ".next",
-            ".pytest_cache",
-            "build",
-            ".idea",
-            ".dart_tool",
-            "ios",
-            "android",
-            "web",
-            "macos",
-        ]
-    )
+import mmap
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+EXCLUDED_DIRS = frozenset(
+    {
+        ".git",
+        "node_modules",
+        ".vscode",
+        ".next",
+        ".pytest_cache",
+        "build",
+        ".idea",
+        ".dart_tool",
+        "ios",
+        "android",
+        "web",
+        "macos",
+    }
 )
-EXCLUDED_FILES = list(
-    set(
-        [
-            ".cursorrules",
-            ".cursorrules-template",
-            "cursorruler.py",
-            ".d.ts",
-            ".tool-versions",
-            ".lock",
-            ".env",
-            ".g.dart",
-            ".g.yaml",
-            ".g.json",
-            ".freezed.dart",
-            ".arb",
-            "README.md",
-        ]
-    )
+EXCLUDED_FILES = frozenset(
+    {
+        ".cursorrules",
+        ".cursorrules-template",
+        "cursorruler.py",
+        ".d.ts",
+        ".tool-versions",
+        ".lock",
+        ".env",
+        ".g.dart",
+        ".g.yaml",
+        ".g.json",
+        ".freezed.dart",
+        ".arb",
+        "README.md",
+    }
+)
+# Entries starting with a dot double as suffixes (".g.dart", ".lock", ...)
+EXCLUDED_SUFFIXES = tuple(name for name in EXCLUDED_FILES if name.startswith("."))
+
+# File patterns
+INCLUDE_PATTERNS = [
+    "**/*.dart",
+    "**/*.yaml",
+    "**/*.ts",
+    "**/*.tsx",
+    "**/*.json",
+    "**/*.js",
+    "**/*.jsx",
+    "**/*.md",
+    "**/*.html",
+    "**/*.css",
+    "**/*.scss",
+    "**/*.less",
+    "**/*.styl",
+]
+EXCLUDE_PATTERNS = [
+    "**/Makefile",
+    "**/*.md",
+    "**/*.txt",
+    ".vscode/**",
+    "**/node_modules/**",  # Modified to exclude all nested files
+    "**/.git/**",  # Modified to exclude all nested files
+    "**/.cursorrules",
+    "**/.cursorrules-template",
+    "**/*.txt",
+    "**/*.env",  # Environment files
+    "**/*.pem",  # Certificate files
+    "**/*.pub",  # Public key files
+    "**/*.tfstate",  # Terraform state files
+    "**/*.tfstate.backup",  # Terraform state backup files
+    "**/*.tfplan",  # Terraform plan files
+    "**/*.tfplan.json",  # Terraform plan JSON files
+    "build/**",
+    "**/build/**",
+    "ios",
+    "android",
+    "web",
+    "macos",
+]
+
+
+def _compile_globs(patterns):
+    """Compile glob patterns into one regex matched against relative paths."""
+    regexes = []
+    for pattern in patterns:
+        if pattern.startswith("**/"):
+            # "**/" may match zero directories, so also try the bare pattern
+            pattern = pattern[3:]
+            regexes.append(fnmatch.translate("*/" + pattern))
+        regexes.append(fnmatch.translate(pattern))
+    return re.compile("|".join(regexes)) if regexes else None
+
+
+def _is_suffix_glob(pattern):
+    """Whether pattern is a plain "**/*.ext" glob that a suffix check can match."""
+    return pattern.startswith("**/*.") and pattern[len("**/*.") :].isalnum()
+
+
+# "**/*.ext" patterns are matched by file suffix alone; anything else falls
+# back to the compiled glob regex.
+INCLUDE_SUFFIXES = frozenset(
+    pattern[len("**/*") :] for pattern in INCLUDE_PATTERNS if _is_suffix_glob(pattern)
 )
+_INCL_RE = _compile_globs(
+    [pattern for pattern in INCLUDE_PATTERNS if not _is_suffix_glob(pattern)]
+)
+_EXCL_RE = _compile_globs(EXCLUDE_PATTERNS)
+
+# Large enough that the combined output is flushed in a handful of writes
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Number of files read ahead of the one being processed when running in-process
+PREFETCH_DEPTH = 8
+
+# Dart/YAML files at least this large are minified from an mmap as bytes
+MMAP_THRESHOLD = 1024 * 1024
+_MINIFY_EXTS = frozenset([".dart", ".yaml"])
+
+# Larger contents bypass the processing cache
+CACHE_MAX_CONTENT = 1024 * 1024
+
+# String literals are captured and kept; runs of whitespace and comments
+# collapse into a single space. Possessive quantifiers (Python 3.11+) stop
+# the engine from backtracking into long runs; older versions use greedy ones.
+# An unterminated /* runs to the end of input, as the old scanner did, so a
+# file full of unclosed "/*" (e.g. YAML globs) is scanned once, not per "/*".
+_P = "+" if sys.version_info >= (3, 11) else ""
+_MINIFY_PATTERN = (
+    r"('''.*?'''|\"\"\".*?\"\"\""
+    r"|\"(?:\\.|[^\"\\\n])*{P}\"|'(?:\\.|[^'\\\n])*{P}'"
+    r"|`(?:\\.|[^`\\])*{P}`)"
+    r"|(?:\s+{P}|/\*.*?(?:\*/|\Z)|//[^\n]*{P})+{P}"
+).format(P=_P)
+# The str pattern is ASCII-only, like the bytes one, so small files and
+# mmap'd large ones minify identically
+_MINIFY_RE = re.compile(_MINIFY_PATTERN, re.S | re.ASCII)
+_MINIFY_BYTES_RE = re.compile(_MINIFY_PATTERN.encode(), re.S)
+# What bytes.strip() removes, for the str side
+_ASCII_WHITESPACE = " \t\n\r\x0b\x0c"
+
+
+def _minify_repl(match: re.Match) -> str:
+    return match.group(1) or " "
+
+
+def _minify_bytes_repl(match: re.Match) -> bytes:
+    return match.group(1) or b" "
+
+
+def _minify(content: str) -> str:
+    """Remove comments, newlines, and excessive whitespace."""
+    return _MINIFY_RE.sub(_minify_repl, content).strip(_ASCII_WHITESPACE)
 
 
 def parse_args():
@@ -52,217 +178,268 @@ def parse_args():
     parser.add_argument(
         "output_file",
         nargs="?",
-        default="combined_output.txt",
-        help="Output file path (default: combined_output.txt)",
+        help=(
+            "Also write the combined output to this file "
+            "(implies --keep-intermediate)"
+        ),
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--keep-intermediate",
+        action="store_true",
+        help=(
+            "Also write the combined output to output_file for debugging "
+            "(default file: combined_output.txt)"
+        ),
+    )
+    parser.add_argument(
+        "--use-tree-binary",
+        action="store_true",
+        help="Render the project tree with the external `tree` command",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes used to minify files (default: CPU count)",
+    )
+    args = parser.parse_args()
+    # Naming an output file only makes sense if it is actually written
+    if args.output_file is not None:
+        args.keep_intermediate = True
+    else:
+        args.output_file = "combined_output.txt"
+    return args
+
+
+def walk(root, tree_lines=None):
+    """Yield paths, relative to root, of candidate files under root.
+
+    Excluded directories are skipped without being descended into.
+
+    If tree_lines is given, a line is appended to it for every directory and
+    file visited so the project tree comes out of the same traversal. As with
+    `tree`, dotfiles and dot directories are left out of the listing.
+    """
+    for dirpath, dirnames, filenames in os.walk(root, topdown=True):
+        # Assigning the slice in place stops os.walk descending into them
+        dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDED_DIRS)
+        reldir = "" if dirpath == root else os.path.relpath(dirpath, root)
+        # Like `tree`, hide dotfiles and anything under a dot directory
+        if tree_lines is not None and not any(
+            part.startswith(".") for part in reldir.split(os.sep) if part
+        ):
+            depth = reldir.count(os.sep) + 1 if reldir else 0
+            if reldir:
+                name = os.path.basename(dirpath)
+                tree_lines.append("    " * (depth - 1) + "├── " + name)
+            else:
+                tree_lines.append(".")
+            for filename in sorted(filenames):
+                if not filename.startswith("."):
+                    tree_lines.append("    " * depth + "├── " + filename)
+        prefix = reldir + os.sep if reldir else ""
+        for filename in filenames:
+            if filename in EXCLUDED_FILES or filename.endswith(EXCLUDED_SUFFIXES):
+                continue
+            path = prefix + filename
+            if os.path.splitext(filename)[1] not in INCLUDE_SUFFIXES and not (
+                _INCL_RE is not None and _INCL_RE.match(path)
+            ):
+                continue
+            if _EXCL_RE is None or not _EXCL_RE.match(path):
+                yield path
+
 
+def _load_json(content: str):
+    """Parse JSON with orjson when available, retrying with the stdlib.
 
-def process_file_content(file: Path, content: str) -> str:
+    The stdlib accepts some input orjson rejects (NaN, big integers, ...).
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(content)
+
+
+def _process(file_ext: str, content: str) -> str:
+    if file_ext == ".json":
+        # Always serialise with the stdlib so the output does not depend on
+        # whether orjson is installed
+        data = _load_json(content)
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    return _minify(content)
+
+
+# Keyed by (extension, content) so identical files are only processed once
+_process_cached = functools.lru_cache(maxsize=4096)(_process)
+
+
+def process_file_content(file: str, content: str) -> str:
     """Process file content based on file type."""
-    file_ext = file.suffix.lower()
-
-    if file_ext in [".dart", ".yaml", ".json"]:
-        # Remove comments, newlines, and excessive whitespace
-        lines = []
-        in_multiline_comment = False
-        in_string = False
-        string_char = None
-        buffer = []
-        i = 0
-
-        while i < len(content):
-            # Handle multi-line comments
-            if content[i : i + 2] == "/*" and not in_string:
-                in_multiline_comment = True
-                i += 2
-                continue
-            elif content[i : i + 2] == "*/" and in_multiline_comment:
-                in_multiline_comment = False
-                i += 2
-                continue
-            elif in_multiline_comment:
-                i += 1
-                continue
+    file_ext = os.path.splitext(file)[1].lower()
+    if file_ext != ".json" and file_ext not in _MINIFY_EXTS:
+        return content
 
-            # Handle single-line comments
-            if content[i : i + 2] == "//" and not in_string:
-                while i < len(content) and content[i] != "\n":
-                    i += 1
-                continue
+    # Keep very large files out of the cache so they don't pin memory
+    process = _process if len(content) > CACHE_MAX_CONTENT else _process_cached
+    try:
+        return process(file_ext, content)
+    except json.JSONDecodeError:
+        # e.g. tsconfig.json with comments; minify it like source instead
+        print(f"Warning: Could not parse JSON file {file}")
+        return _minify(content)
 
-            # Handle strings
-            if content[i] in ['"', "'", "`"] and (i == 0 or content[i - 1] != "\\"):
-                if not in_string:
-                    in_string = True
-                    string_char = content[i]
-                elif content[i] == string_char:
-                    in_string = False
-                buffer.append(content[i])
-                i += 1
-                continue
 
-            # Handle whitespace
-            if content[i].isspace() and not in_string:
-                if buffer and not buffer[-1].isspace():
-                    buffer.append(" ")
-                i += 1
-                continue
+def _minify_mapped(file: str) -> str:
+    """Minify a large Dart/YAML file without decoding it up front."""
+    with open(file, "rb") as infile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _MINIFY_BYTES_RE.sub(_minify_bytes_repl, mm).strip().decode()
 
-            buffer.append(content[i])
-            i += 1
 
-        return "".join(buffer).strip()
+def _read_file(file: str):
+    """Return the file's text, or None if it should go through _minify_mapped."""
+    if (
+        os.path.splitext(file)[1].lower() in _MINIFY_EXTS
+        and os.path.getsize(file) >= MMAP_THRESHOLD
+    ):
+        return None
+    # UTF-8, matching how _minify_mapped decodes
+    with open(file, "r", encoding="utf-8") as infile:
+        return infile.read()
+
+
+def _process_loaded(file: str, content):
+    if content is None:
+        return _minify_mapped(file)
+    return process_file_content(file, content)
+
+
+def _read_and_process(file: str):
+    """Read and process one file, returning (file, content, error)."""
+    try:
+        return file, _process_loaded(file, _read_file(file)), None
+    except Exception as e:
+        return file, None, e
+
+
+def _prefetch_and_process(files):
+    """Process files in order while a thread pool reads the next ones."""
+    files = iter(files)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        pending = deque(
+            (file, pool.submit(_read_file, file))
+            for file in islice(files, PREFETCH_DEPTH)
+        )
+        while pending:
+            file, future = pending.popleft()
+            for next_file in islice(files, 1):
+                pending.append((next_file, pool.submit(_read_file, next_file)))
+            try:
+                result = file, _process_loaded(file, future.result()), None
+            except Exception as e:
+                result = file, None, e
+            yield result
 
-    elif file_ext == ".json":
-        try:
-            return json.dumps(json.loads(content), separators=(",", ":"))
-        except json.JSONDecodeError:
-            print(f"Warning: Could not parse JSON file {file}")
-            return content
 
-    return content
+def read_and_process_all(files, jobs):
+    """Yield _read_and_process results for files, in order."""
+    if jobs is None or jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # Batch files per task so pickling overhead is amortised
+            yield from executor.map(_read_and_process, files, chunksize=16)
+    else:
+        yield from _prefetch_and_process(files)
 
 
 def main():
     args = parse_args()
 
     # Get script and output paths
-    script_path = Path(__file__).resolve()
+    script_path = os.path.relpath(__file__)
     output_path = Path(args.output_file).resolve()
 
-    # File patterns
-    include_patterns = [
-        "**/*.dart",
-        "**/*.yaml",
-        "**/*.ts",
-        "**/*.tsx",
-        "**/*.json",
-        "**/*.js",
-        "**/*.jsx",
-        "**/*.md",
-        "**/*.html",
-        "**/*.css",
-        "**/*.scss",
-        "**/*.less",
-        "**/*.styl",
-    ]
-
-    exclude_patterns = [
-        "**/Makefile",
-        "**/*.md",
-        "**/*.txt",
-        ".vscode/**",
-        "**/node_modules/**",  # Modified to exclude all nested files
-        "**/.git/**",  # Modified to exclude all nested files
-        "**/.cursorrules",
-        "**/.cursorrules-template",
-        "**/*.txt",
-        "**/*.env",  # Environment files
-        "**/*.pem",  # Certificate files
-        "**/*.pub",  # Public key files
-        "**/*.tfstate",  # Terraform state files
-        "**/*.tfstate.backup",  # Terraform state backup files
-        "**/*.tfplan",  # Terraform plan files
-        "**/*.tfplan.json",  # Terraform plan JSON files
-        "build/**",
-        "**/build/**",
-        "ios",
-        "android",
-        "web",
-        "macos",
-    ]
-
     # Display configuration
     print("Configuration:")
-    print(f" Output file: {output_path}")
-    print(f" Including: {', '.join(include_patterns)}")
-    print(f" Excluding: {', '.join(exclude_patterns)}")
+    if args.keep_intermediate:
+        print(f" Output file: {output_path}")
+    print(f" Including: {', '.join(INCLUDE_PATTERNS)}")
+    print(f" Excluding: {', '.join(EXCLUDE_PATTERNS)}")
 
     print("\nGenerating file tree...\n")
 
-    # First get all excluded files
-    excluded_files = set()
-    for pattern in exclude_patterns:
-        excluded_files.update(Path().glob(pattern))
-
-    # Then get matching files and remove excluded ones
-    matching_files = set()
-    for pattern in include_patterns:
-        for file in Path().glob(pattern):
-            if file not in excluded_files:
-                matching_files.add(file)
-
-    # Remove script itself and output file
-    matching_files.discard(script_path)
-    matching_files.discard(output_path)
+    # Walk the tree once, collecting matching files and the tree listing.
+    # The script itself and the output file are left out.
+    skipped = {script_path, os.path.relpath(output_path)}
+    tree_lines = []
+    matching_files = [
+        path for path in walk(os.curdir, tree_lines) if path not in skipped
+    ]
+    # Paths are plain str, so this is a straight unicode comparison sort
+    matching_files.sort()
 
     # Generate and display tree output
-    tree_output = generate_tree()
+    tree_output = (args.use_tree_binary and generate_tree()) or "\n".join(tree_lines)
     print(tree_output)
 
     print("\nStarting file combination...\n")
 
     # Process files
     processed_count = 0
-    with open(output_path, "w") as outfile:
-        # Write tree as a variable instead of raw output
-        outfile.write("<project-tree>\n")
-        outfile.write(tree_output + "\n")
-        outfile.write("</project-tree>\n")
-        outfile.write("<codebase>\n")
-
-        for file in sorted(matching_files):
-            if any(pattern in str(file) for pattern in EXCLUDED_DIRS + EXCLUDED_FILES):
-                continue
-            print(f"Processing: {file}")
-            outfile.write(f"\n=== {file} ===\n\n")
-            try:
-                with open(file, "r") as infile:
-                    content = infile.read()
-                    processed_content = process_file_content(file, content)
-                    outfile.write(processed_content)
-                processed_count += 1
-            except Exception as e:
-                print(f"Error processing {file}: {e}")
-
-        outfile.write("\n</codebase>")
+    # Write tree as a variable instead of raw output
+    pieces = [f"<project-tree>\n{tree_output}\n</project-tree>\n<codebase>\n"]
+
+    results = read_and_process_all(matching_files, args.jobs)
+    for file, processed_content, error in results:
+        print(f"Processing: {file}")
+        pieces.append(f"\n=== {file} ===\n\n")
+        if error is not None:
+            print(f"Error processing {file}: {error}")
+            continue
+        pieces.append(processed_content)
+        processed_count += 1
+
+    pieces.append("\n</codebase>")
+    # Encoded once; everything downstream works on bytes
+    combined_bytes = "".join(pieces).encode("utf-8")
+
+    if args.keep_intermediate:
+        # O_BINARY stops the Windows C runtime translating "\n" to "\r\n"
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        fd = os.open(output_path, flags, 0o644)
+        with io.BufferedWriter(
+            io.FileIO(fd, "w"), buffer_size=WRITE_BUFFER_SIZE
+        ) as outfile:
+            outfile.write(combined_bytes)
 
     # Summary
     print("\nSummary:")
     print(f" Files processed: {processed_count}")
-    print(f" Output location: {output_path}")
-    print(f" Total size: {output_path.stat().st_size} bytes")
+    if args.keep_intermediate:
+        print(f" Output location: {output_path}")
+    print(f" Total size: {len(combined_bytes)} bytes")
 
     # Post-processing
     print("\nPerforming post-processing...")
     try:
-        # Read the combined output
-        with open(output_path, "r") as f:
-            combined_content = f.read()
-
         # Copy template and replace content
         template_path = Path(".cursorrules-template")
         rules_path = Path(".cursorrules")
 
-        if not template_path.exists():
+        try:
+            template_bytes = template_path.read_bytes()
+        except FileNotFoundError:
             print(f"Error: Template file '{template_path}' not found.")
             sys.exit(1)
 
-        with open(template_path, "r") as f:
-            template_content = f.read()
-
-        final_content = template_content.replace("${CODEBASE}", combined_content)
-
-        with open(rules_path, "w") as f:
-            f.write(final_content)
-
-        # Remove the temporary combined output
-        output_path.unlink()
+        rules_path.write_bytes(template_bytes.replace(b"${CODEBASE}", combined_bytes))
 
         print("Post-processing completed successfully:")
         print(f" - Created: {rules_path}")
-        print(f" - Removed: {output_path}")
 
     except Exception as e:
         print(f"Error during post-processing: {e}")
@@ -270,13 +447,14 @@ def main():
 
 
 def generate_tree():
+    """Render the project tree with `tree`, or return None if unavailable."""
     try:
         result = subprocess.run(
             [
                 "tree",
                 "--noreport",
                 "-I",
-                "node_modules|.git|.vscode|build|ios|android|web",
+                "|".join(sorted(EXCLUDED_DIRS)),
             ],
             capture_output=True,
             text=True,
@@ -285,16 +463,7 @@ def generate_tree():
             return result.stdout.strip()  # Ensure we return a valid string
     except FileNotFoundError:
         pass
-
-    # Fall back to simple directory traversal
-    tree_output = ["."]
-    for path in sorted(Path().rglob("*")):
-        if path.is_file() and not any(
-            pattern in str(path) for pattern in [".git", "node_modules", ".vscode"]
-        ):
-            depth = len(path.parts) - 1
-            tree_output.append("    " * depth + "├── " + path.name)
-    return "\n".join(tree_output)
+    return None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,24 @@
+import time
+import unittest
+
+import cursorruler
+
+
+class MinifyTest(unittest.TestCase):
+    def test_unterminated_comment_runs_to_end(self):
+        self.assertEqual(
+            cursorruler.process_file_content("a.dart", "a /* x */ b /* open\n c"),
+            "a b",
+        )
+
+    def test_many_unclosed_comments_stay_linear(self):
+        # Unquoted globs in build.yaml used to make the regex quadratic
+        content = "sources:\n" + "  - lib/models/*.dart\n" * 8000
+        start = time.perf_counter()
+        result = cursorruler.process_file_content("build.yaml", content)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(result, "sources: - lib/models")
+
+
+if __name__ == "__main__":
+    unittest.main()